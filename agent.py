@@ -1,24 +1,28 @@
 import asyncio
 import logging
-import time
-from typing import Optional
+import uuid
+from time import perf_counter_ns
+from typing import AsyncIterator, Optional
+import httpx
 from livekit.agents import JobContext, llm
 from livekit import rtc
 
-from services.stt_service import STTService
+from services.stt_service import STTService, SAMPLE_RATE as STT_SAMPLE_RATE
 from services.llm_service import LLMService
-from services.tts_service import TTSService
+from services.tts_service import TTSService, SAMPLE_RATE as TTS_SAMPLE_RATE
 from utils.metrics import MetricsCollector
 from utils.excel_logger import ExcelLogger
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+WELCOME_MESSAGE = "Hello! I'm your AI voice assistant. How can I help you today?"
+
 class VoiceAgent:
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         self.stt_service = STTService()
-        self.llm_service = LLMService()
-        self.tts_service = TTSService()
+        self.llm_service = LLMService(http_client)
+        self.tts_service = TTSService(http_client)
         self.metrics = MetricsCollector()
         self.excel_logger = ExcelLogger()
         
@@ -27,15 +31,22 @@ class VoiceAgent:
         self.session_id: Optional[str] = None
         self.conversation_active = False
         self.current_audio_track: Optional[rtc.AudioTrack] = None
+        self.audio_source: Optional[rtc.AudioSource] = None
         
         # Pipeline state
         self.is_speaking = False
         self.interrupt_requested = False
+        self._ttfb_start = 0
+        # When the current response's first audio frame went out, None while nothing is playing
+        self._playback_started_at: Optional[int] = None
+        self._session_ended = asyncio.Event()
+        # Set once the services are warm and the outgoing track is published
+        self._ready = asyncio.Event()
         
     async def start(self, ctx: JobContext):
         """Start the voice agent"""
         self.room = ctx.room
-        self.session_id = f"session_{int(time.time())}"
+        self.session_id = f"session_{uuid.uuid4().hex[:12]}"
         
         logger.info(f"Voice agent started for session: {self.session_id}")
         
@@ -44,19 +55,42 @@ class VoiceAgent:
         self.room.on("participant_disconnected", self._on_participant_disconnected)
         self.room.on("track_subscribed", self._on_track_subscribed)
         self.room.on("track_unsubscribed", self._on_track_unsubscribed)
+        self.room.on("disconnected", lambda *args: self._session_ended.set())
         
         # Initialize metrics for this session
         self.metrics.start_session(self.session_id)
         
+        # Warm up all three services concurrently so the first turn doesn't pay connection setup,
+        # and publish the track that agent speech is streamed into
+        await asyncio.gather(
+            self.stt_service.warmup(),
+            self.llm_service.warmup(),
+            self.tts_service.warmup(WELCOME_MESSAGE),
+            self._publish_audio_track()
+        )
+        self._ready.set()
+        
         # Wait for the session to end
         await self._wait_for_session_end()
         
+    async def _publish_audio_track(self):
+        """Publish the agent's outgoing audio track to the room"""
+        try:
+            self.audio_source = rtc.AudioSource(TTS_SAMPLE_RATE, 1)
+            track = rtc.LocalAudioTrack.create_audio_track("agent-voice", self.audio_source)
+            options = rtc.TrackPublishOptions(source=rtc.TrackSource.SOURCE_MICROPHONE)
+            await self.room.local_participant.publish_track(track, options)
+            logger.info("Agent audio track published")
+        except Exception as e:
+            logger.error(f"Error publishing audio track: {e}")
+            self.audio_source = None
+    
     async def _wait_for_session_end(self):
         """Wait for the session to end and handle cleanup"""
         try:
-            # Keep the agent running until disconnected
-            while self.room.connection_state == rtc.ConnectionState.CONN_CONNECTED:
-                await asyncio.sleep(1)
+            # Keep the agent running until the room reports it has disconnected
+            if self.room.connection_state == rtc.ConnectionState.CONN_CONNECTED:
+                await self._session_ended.wait()
         except Exception as e:
             logger.error(f"Error during session: {e}")
         finally:
@@ -66,12 +100,14 @@ class VoiceAgent:
         """Clean up resources and export metrics"""
         logger.info(f"Cleaning up session: {self.session_id}")
         
+        # Release the Deepgram websocket and its worker threads
+        await self.stt_service.close()
+        
         # End metrics collection
         session_metrics = self.metrics.end_session(self.session_id)
         
         # Export to Excel
-        if session_metrics:
-            await self.excel_logger.export_session_metrics(self.session_id, session_metrics)
+        if session_metrics and await self.excel_logger.export_session_metrics(self.session_id, session_metrics):
             logger.info(f"Session metrics exported for: {self.session_id}")
     
     async def _on_participant_connected(self, participant: rtc.RemoteParticipant):
@@ -104,110 +140,156 @@ class VoiceAgent:
     
     async def _send_welcome_message(self):
         """Send welcome message to the participant"""
-        welcome_text = "Hello! I'm your AI voice assistant. How can I help you today?"
-        await self._generate_and_send_audio(welcome_text)
+        # A participant can join during warmup; wait so the track exists and the cached clip is reused
+        await self._ready.wait()
+        await self._generate_and_send_audio(WELCOME_MESSAGE)
     
     async def _process_audio_stream(self, audio_track: rtc.AudioTrack):
         """Process incoming audio stream for STT"""
         logger.info("Starting audio stream processing")
         
+        # Transcripts are consumed independently so sending audio never waits on STT
+        utterance_task = asyncio.create_task(self._process_utterances())
+        
+        # Let LiveKit resample to the 16kHz mono format Deepgram is configured for
+        audio_stream = rtc.AudioStream(audio_track, sample_rate=STT_SAMPLE_RATE, num_channels=1)
+        
         try:
-            async for audio_frame in audio_track:
+            async for event in audio_stream:
+                audio_frame = event.frame
+                
                 if not self.conversation_active:
                     self.conversation_active = True
                 
-                # Check for interruption
-                if self.is_speaking:
+                # Send audio frame to STT
+                await self.stt_service.push_frame(audio_frame)
+                
+                # Check for interruption: the participant started talking over the agent's audio,
+                # not merely kept talking through the tail of their own turn
+                if (self._playback_started_at is not None and self.stt_service.speech_active
+                        and self.stt_service.speech_started_at > self._playback_started_at
+                        and not self.interrupt_requested):
                     self.interrupt_requested = True
+                    self.metrics.record_interruption(self.session_id)
                     logger.info("Interruption detected, stopping current speech")
                 
-                # Process audio frame through STT
-                await self._process_audio_frame(audio_frame)
-                
         except Exception as e:
             logger.error(f"Error processing audio stream: {e}")
+        finally:
+            utterance_task.cancel()
+            await audio_stream.aclose()
     
-    async def _process_audio_frame(self, audio_frame):
-        """Process individual audio frame"""
+    async def _process_utterances(self):
+        """Process completed utterances from STT"""
         try:
-            # Record EOU (End of Utterance) start time
-            eou_start_time = time.time()
-            
-            # Convert audio frame and process through STT
-            transcript = await self.stt_service.transcribe_audio(audio_frame)
-            
-            if transcript and transcript.strip():
-                logger.info(f"Transcribed: {transcript}")
+            async for transcript in self.stt_service.utterances():
+                logger.info("Transcribed: %s", transcript)
                 
                 # Record EOU delay
-                eou_delay = time.time() - eou_start_time
-                self.metrics.record_eou_delay(self.session_id, eou_delay)
+                self.metrics.record_eou_delay(self.session_id, self.stt_service.last_eou_delay)
                 
                 # Process through the pipeline
                 await self._process_conversation(transcript)
                 
         except Exception as e:
-            logger.error(f"Error processing audio frame: {e}")
+            logger.error(f"Error processing utterances: {e}")
     
     async def _process_conversation(self, user_input: str):
         """Process conversation through LLM and TTS pipeline"""
+        # Total latency and TTFT are both measured from the moment the user input arrives
+        turn_start = perf_counter_ns()
+        self.interrupt_requested = False
+        
         try:
-            # Record TTFT (Time to First Token) start
-            ttft_start_time = time.time()
-            
-            # Generate LLM response
-            llm_response = await self.llm_service.generate_response(user_input)
-            
-            if llm_response:
-                # Record TTFT
-                ttft = time.time() - ttft_start_time
-                self.metrics.record_ttft(self.session_id, ttft)
-                
-                logger.info(f"LLM Response: {llm_response}")
-                
-                # Generate and send audio response
-                await self._generate_and_send_audio(llm_response)
+            # LLM tokens are fed straight into the TTS stream, so speech starts before the first sentence ends
+            tokens = self._timed_tokens(user_input, turn_start)
+            await self._send_audio(self.tts_service.stream_text(tokens), turn_start)
             
         except Exception as e:
             logger.error(f"Error processing conversation: {e}")
     
-    async def _generate_and_send_audio(self, text: str):
-        """Generate audio from text and send to room"""
-        try:
-            # Record TTFB (Time to First Byte) start
-            ttfb_start_time = time.time()
+    async def _timed_tokens(self, user_input: str, turn_start: int) -> AsyncIterator[str]:
+        """Stream LLM tokens, recording TTFT and starting the TTFB clock on the first one"""
+        first_token = True
+        async for token in self.llm_service.stream_tokens(user_input):
+            if first_token:
+                # Record TTFT (Time to First Token)
+                self._ttfb_start = perf_counter_ns()
+                ttft = (self._ttfb_start - turn_start) / 1e9
+                self.metrics.record_ttft(self.session_id, ttft)
+                first_token = False
             
+            yield token
+    
+    async def _generate_and_send_audio(self, text: str) -> bool:
+        """Generate audio from text and stream it to the room, returning whether any audio was sent"""
+        # Record TTFB (Time to First Byte) start
+        self._ttfb_start = perf_counter_ns()
+        return await self._send_audio(self.tts_service.stream_audio(text))
+    
+    async def _send_audio(self, audio_stream: AsyncIterator[bytes], turn_start: Optional[int] = None) -> bool:
+        """Stream TTS audio chunks to the room, returning whether any audio was sent"""
+        audio_sent = False
+        try:
             # Set speaking state
             self.is_speaking = True
-            self.interrupt_requested = False
             
-            # Generate audio through TTS
-            audio_data = await self.tts_service.generate_audio(text)
+            audio_bytes = 0
+            ttfb = None
+            # 16-bit samples can be split across TTS chunks, so carry the odd byte over
+            remainder = b""
             
-            if audio_data:
-                # Record TTFB
-                ttfb = time.time() - ttfb_start_time
-                self.metrics.record_ttfb(self.session_id, ttfb)
-                
-                # Record total latency start
-                total_latency_start = time.time()
+            # Forward audio chunks to the room as TTS produces them
+            async for chunk in audio_stream:
+                if self.interrupt_requested:
+                    logger.info("Speech interrupted by participant")
+                    # Drop the audio already queued for playback so the agent stops right away
+                    if self.audio_source:
+                        self.audio_source.clear_queue()
+                    break
                 
-                # Create and play audio through room
-                # For now, we'll log that audio would be sent
-                # In a full implementation, you'd convert audio_data to proper format and stream it
-                logger.info(f"Audio response ready ({len(audio_data)} bytes) - would be streamed to participant")
+                if ttfb is None:
+                    # Record TTFB
+                    ttfb = (perf_counter_ns() - self._ttfb_start) / 1e9
+                    self.metrics.record_ttfb(self.session_id, ttfb)
                 
-                # Record total latency
-                total_latency = time.time() - total_latency_start
-                self.metrics.record_total_latency(self.session_id, total_latency)
+                audio_bytes += len(chunk)
+                # Send only whole samples; an odd trailing byte waits for the next chunk
+                pcm = remainder + chunk
+                usable = len(pcm) - len(pcm) % 2
+                remainder = pcm[usable:]
                 
-                # Log latency warning if above target
-                if total_latency > Config.TARGET_LATENCY:
-                    logger.warning(f"Total latency ({total_latency:.2f}s) exceeds target ({Config.TARGET_LATENCY}s)")
-                
-                logger.info(f"Audio sent - TTFB: {ttfb:.3f}s, Total: {total_latency:.3f}s")
+                if usable and self.audio_source:
+                    await self.audio_source.capture_frame(rtc.AudioFrame(
+                        data=pcm[:usable],
+                        sample_rate=TTS_SAMPLE_RATE,
+                        num_channels=1,
+                        samples_per_channel=usable // 2
+                    ))
+                    
+                    if not audio_sent:
+                        audio_sent = True
+                        self._playback_started_at = perf_counter_ns()
+                        if turn_start is not None:
+                            # Record total latency: user input to first audio delivered
+                            total_latency = (perf_counter_ns() - turn_start) / 1e9
+                            self.metrics.record_total_latency(self.session_id, total_latency)
+                            
+                            # Log latency warning if above target
+                            if total_latency > Config.TARGET_LATENCY:
+                                logger.warning("Total latency (%.2fs) exceeds target (%ss)", total_latency, Config.TARGET_LATENCY)
+                            
+                            logger.info("First audio sent - TTFB: %.3fs, Total: %.3fs", ttfb, total_latency)
+            
+            if audio_sent:
+                logger.info("Audio sent (%d bytes) - TTFB: %.3fs", audio_bytes, ttfb)
             
         except Exception as e:
             logger.error(f"Error generating audio: {e}")
         finally:
             self.is_speaking = False
+            self._playback_started_at = None
+            # Close the TTS stream right away so an interrupted response stops generating
+            await audio_stream.aclose()
+        
+        return audio_sent
@@ -20,6 +20,8 @@ class Config:
     CARTESIA_API_KEY = os.getenv("CARTESIA_API_KEY", "")
     TTS_PROVIDER = os.getenv("TTS_PROVIDER", "elevenlabs")
     VOICE_ID = os.getenv("VOICE_ID", "21m00Tcm4TlvDq8ikWAM")
+    TTS_CACHE_SIZE = 128  # cached utterances
+    TTS_CACHE_MAX_CHARS = 200  # only short, repeated phrases are worth caching
     
     # Agent Configuration
     AGENT_NAME = os.getenv("AGENT_NAME", "AI-Voice-Agent")
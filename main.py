@@ -3,6 +3,7 @@
 import asyncio
 import logging
 import os
+import httpx
 from livekit.agents import AutoSubscribe, JobContext, WorkerOptions, cli
 
 from agent import VoiceAgent
@@ -21,9 +22,14 @@ async def entrypoint(ctx: JobContext):
     """
     logger.info(f"Starting voice agent for room: {ctx.room.name}")
     
-    # Create and start the voice agent
-    agent = VoiceAgent()
-    await agent.start(ctx)
+    # One pooled HTTP client for Groq and ElevenLabs so keep-alive connections are shared
+    async with httpx.AsyncClient(
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=32)
+    ) as http_client:
+        # Create and start the voice agent
+        agent = VoiceAgent(http_client)
+        await agent.start(ctx)
 
 if __name__ == "__main__":
     # Ensure required directories exist
@@ -1,67 +1,121 @@
 import logging
-from typing import Optional
-from groq import Groq
+import re
+from collections import deque
+from typing import AsyncIterator, Optional
+import httpx
+from groq import AsyncGroq
 
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Split after sentence-ending punctuation so each sentence can be voiced on its own
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+FALLBACK_RESPONSE = "I'm sorry, I didn't catch that. Could you please repeat?"
+
 class LLMService:
-    def __init__(self):
-        self.client = Groq(api_key=Config.GROQ_API_KEY)
-        self.conversation_history = []
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self.client = AsyncGroq(api_key=Config.GROQ_API_KEY, http_client=http_client)
+        # Keep the last 10 exchanges to manage token limit
+        self.conversation_history = deque(maxlen=20)
+        self._total_messages = 0
+        self._total_tokens = 0
         self.system_prompt = """You are a helpful AI voice assistant. 
         Keep your responses conversational, concise, and engaging. 
         Respond as if you're speaking naturally in a conversation.
         Avoid overly long responses to maintain good conversation flow."""
         
     async def generate_response(self, user_input: str) -> Optional[str]:
-        """Generate response using Groq LLM"""
-        try:
-            # Add user input to conversation history
-            self.conversation_history.append({"role": "user", "content": user_input})
-            
-            # Prepare messages for LLM
-            messages = [{"role": "system", "content": self.system_prompt}]
-            
-            # Add recent conversation history (keep last 10 exchanges to manage token limit)
-            recent_history = self.conversation_history[-10:]
-            messages.extend(recent_history)
+        """Generate a complete response using Groq LLM"""
+        sentences = [sentence async for sentence in self.stream_response(user_input)]
+        return " ".join(sentences) if sentences else None
+    
+    async def stream_response(self, user_input: str) -> AsyncIterator[str]:
+        """Stream the response from Groq LLM one sentence at a time"""
+        buffer = ""
+        async for token in self.stream_tokens(user_input):
+            buffer += token
             
-            # Generate response using Groq
-            response = self.client.chat.completions.create(
+            # Flush every completed sentence, keep the trailing fragment buffered
+            *sentences, buffer = SENTENCE_BOUNDARY.split(buffer)
+            for sentence in sentences:
+                if sentence.strip():
+                    yield sentence.strip()
+        
+        if buffer.strip():
+            yield buffer.strip()
+    
+    async def stream_tokens(self, user_input: str) -> AsyncIterator[str]:
+        """Stream the response from Groq LLM token by token"""
+        # Add user input to conversation history
+        self._add_to_history("user", user_input)
+        
+        # Prepare messages for LLM with the recent conversation history
+        messages = [{"role": "system", "content": self.system_prompt}]
+        messages.extend(self.conversation_history)
+        
+        # Tokens are collected in a list and joined once rather than concatenated per token
+        response_parts = []
+        try:
+            # Generate response using Groq's native async streaming client
+            stream = await self.client.chat.completions.create(
                 model="llama3-8b-8192",  # Fast model for low latency
                 messages=messages,
                 max_tokens=150,  # Keep responses concise for voice
                 temperature=0.7,
-                stream=False  # Use non-streaming for simpler implementation
+                stream=True
             )
             
-            if response.choices and len(response.choices) > 0:
-                assistant_response = response.choices[0].message.content
-                
-                # Add assistant response to history
-                self.conversation_history.append({"role": "assistant", "content": assistant_response})
+            # Closing the stream returns its connection to the pool even if the reader stops early
+            async with stream:
+                async for chunk in stream:
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    
+                    token = chunk.choices[0].delta.content
+                    response_parts.append(token)
+                    yield token
                 
-                logger.info(f"Generated LLM response: {assistant_response[:100]}...")
-                return assistant_response
-            
         except Exception as e:
             logger.error(f"LLM generation error: {e}")
-            # Return fallback response
-            return "I'm sorry, I didn't catch that. Could you please repeat?"
-        
-        return None
+            if not response_parts:
+                # Return fallback response
+                yield FALLBACK_RESPONSE
+        finally:
+            # Keep whatever was said, even when interrupted, so history never ends on an unanswered message
+            assistant_response = "".join(response_parts)
+            if assistant_response:
+                # Add assistant response to history
+                self._add_to_history("assistant", assistant_response)
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("Generated LLM response: %s...", assistant_response[:100])
+    
+    async def warmup(self):
+        """Open the connection to Groq before the first user turn"""
+        try:
+            await self.client.models.list()
+            logger.info("LLM connection warmed up")
+        except Exception as e:
+            logger.warning(f"LLM warmup failed: {e}")
+    
+    def _add_to_history(self, role: str, content: str):
+        """Append a message to the rolling history and update running totals"""
+        self.conversation_history.append({"role": role, "content": content})
+        self._total_messages += 1
+        self._total_tokens += len(content.split())
     
     def clear_history(self):
         """Clear conversation history"""
-        self.conversation_history = []
+        self.conversation_history.clear()
+        self._total_messages = 0
+        self._total_tokens = 0
         logger.info("Conversation history cleared")
     
     def get_conversation_summary(self) -> dict:
         """Get conversation summary for metrics"""
         return {
-            "total_exchanges": len(self.conversation_history) // 2,
-            "total_tokens_estimated": sum(len(msg["content"].split()) for msg in self.conversation_history),
-            "conversation_length": len(self.conversation_history)
+            "total_exchanges": self._total_messages // 2,
+            "total_tokens_estimated": self._total_tokens,
+            "conversation_length": self._total_messages
         }
@@ -1,77 +1,196 @@
 import asyncio
 import logging
 import json
-from typing import Optional
+import operator
+from time import perf_counter_ns
+from collections import deque
+from typing import AsyncIterator, Optional
 import websockets
 import base64
-from deepgram import DeepgramClient, PrerecordedOptions, LiveTranscriptionEvents, LiveOptions
+import numpy as np
+import webrtcvad
+from deepgram import DeepgramClient, DeepgramClientOptions, PrerecordedOptions, LiveTranscriptionEvents, LiveOptions
 
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Deepgram is configured for 16kHz mono linear16
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+# Frames are batched into ~100ms payloads before being sent over the websocket
+BATCH_BYTES = BYTES_PER_SECOND // 10
+
+# Voice activity detection gates which audio reaches Deepgram
+VAD_FRAME_MS = 30  # webrtcvad accepts 10, 20 or 30ms frames
+VAD_FRAME_BYTES = BYTES_PER_SECOND * VAD_FRAME_MS // 1000
+PRE_ROLL_FRAMES = 300 // VAD_FRAME_MS  # audio kept from before speech onset
+UTTERANCE_END_MS = 1000
+HANGOVER_FRAMES = UTTERANCE_END_MS // VAD_FRAME_MS  # trailing silence sent before finalizing
+
+# Live transcription options, built once and reused on every (re)connect
+_LIVE_OPTS = LiveOptions(
+    model="nova-2",
+    language="en-US",
+    smart_format=True,
+    interim_results=False,
+    utterance_end_ms=str(UTTERANCE_END_MS),
+    vad_events=True,
+    encoding="linear16",
+    sample_rate=SAMPLE_RATE,
+    channels=1
+)
+
+MAX_RECONNECT_DELAY = 30  # seconds
+
+# Queued when Deepgram reports an UtteranceEnd event, marking the end of the user's turn
+_UTTERANCE_END = object()
+
 class STTService:
     def __init__(self):
-        self.client = DeepgramClient(Config.DEEPGRAM_API_KEY)
-        self.connection = None
+        # Keepalive lets the connection survive the gaps where VAD sends no audio
+        self.client = DeepgramClient(
+            Config.DEEPGRAM_API_KEY,
+            DeepgramClientOptions(options={"keepalive": "true"})
+        )
+        # One long-lived connection; its event handlers are registered once and survive reconnects
+        self.connection = self.client.listen.websocket.v("1")
+        self.connection.on(LiveTranscriptionEvents.Open, self._on_open)
+        self.connection.on(LiveTranscriptionEvents.Transcript, self._on_transcript)
+        self.connection.on(LiveTranscriptionEvents.UtteranceEnd, self._on_utterance_end)
+        self.connection.on(LiveTranscriptionEvents.Error, self._on_error)
+        self.connection.on(LiveTranscriptionEvents.Close, self._on_close)
         self.is_connected = False
+        # The single in-flight connect (warmup or reconnect); no other connect starts while it runs
+        self._reconnect_task: Optional[asyncio.Task] = None
+        # Handshake running in the executor, which cancelling the task above can't interrupt
+        self._pending_start: Optional[asyncio.Future] = None
+        self._closed = False
+        # Deepgram delivers transcripts on its own worker thread; they are handed
+        # over to the event loop through this queue
+        self._transcript_queue: asyncio.Queue = asyncio.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._send_buffer = bytearray()
+        self._read_frame = None
+        self._dropped_rates = set()
+        
+        # Voice activity state
+        self._vad = webrtcvad.Vad(2)
+        self._vad_buffer = bytearray()
+        self._pre_roll = deque(maxlen=PRE_ROLL_FRAMES)
+        self._silent_frames = 0
+        self._last_speech_time = 0
+        self.speech_active = False
+        self.speech_started_at = 0
+        self.last_eou_delay = 0.0
         
-    async def transcribe_audio(self, audio_frame) -> Optional[str]:
-        """Transcribe audio frame using Deepgram STT"""
+    async def push_frame(self, audio_frame):
+        """Send an audio frame to Deepgram without waiting for a transcript"""
         try:
             if not self.is_connected:
-                await self._connect_live_transcription()
+                # Audio is dropped while a connect is pending; only one runs at a time
+                self._schedule_reconnect()
+                return
             
             # Convert audio frame to bytes
             audio_bytes = self._convert_audio_frame(audio_frame)
             
             if audio_bytes and self.connection:
-                # Send audio data to Deepgram
-                self.connection.send(audio_bytes)
+                self._vad_buffer += audio_bytes
                 
-                # Wait for transcription result (with timeout)
-                result = await asyncio.wait_for(
-                    self._get_transcription_result(), 
-                    timeout=2.0
-                )
+                # Gate every complete VAD frame so silence never reaches the network
+                while len(self._vad_buffer) >= VAD_FRAME_BYTES:
+                    vad_frame = bytes(self._vad_buffer[:VAD_FRAME_BYTES])
+                    del self._vad_buffer[:VAD_FRAME_BYTES]
+                    self._gate_vad_frame(vad_frame)
                 
-                return result
-                
-        except asyncio.TimeoutError:
-            logger.debug("STT timeout - no speech detected")
-            return None
         except Exception as e:
             logger.error(f"STT error: {e}")
-            await self._reconnect()
-            return None
+            self.is_connected = False
+            self._schedule_reconnect()
+    
+    def _gate_vad_frame(self, vad_frame: bytes):
+        """Forward speech frames, with pre-roll and trailing silence, to Deepgram"""
+        if self._vad.is_speech(vad_frame, SAMPLE_RATE):
+            self._last_speech_time = perf_counter_ns()
+            self._silent_frames = 0
+            if not self.speech_active:
+                self.speech_active = True
+                self.speech_started_at = self._last_speech_time
+                # Include the audio just before onset so the first word isn't clipped
+                for frame in self._pre_roll:
+                    self._send_buffer += frame
+                self._pre_roll.clear()
+        elif not self.speech_active:
+            self._pre_roll.append(vad_frame)
+            return
+        else:
+            self._silent_frames += 1
+        
+        self._send_buffer += vad_frame
+        
+        if self._silent_frames >= HANGOVER_FRAMES:
+            # Speech has ended, so send what's left and ask Deepgram to finalize the utterance
+            self.speech_active = False
+            self._silent_frames = 0
+            self._flush_send_buffer()
+            self.connection.finalize()
+        elif len(self._send_buffer) >= BATCH_BYTES:
+            # Send audio data to Deepgram once a full batch has accumulated
+            self._flush_send_buffer()
+    
+    def _flush_send_buffer(self):
+        """Send the batched audio to Deepgram"""
+        if self._send_buffer:
+            self.connection.send(bytes(self._send_buffer))
+            self._send_buffer.clear()
+    
+    async def utterances(self) -> AsyncIterator[str]:
+        """Yield completed utterances once Deepgram marks the end of the user's turn"""
+        # Final segments of the current turn, joined when the turn ends
+        segments = []
+        while True:
+            transcript_data = await self._transcript_queue.get()
+            if transcript_data is not _UTTERANCE_END:
+                if not getattr(transcript_data, 'is_final', True):
+                    continue
+                
+                transcript = self._extract_transcript(transcript_data)
+                if transcript:
+                    segments.append(transcript)
+                
+                # A final segment only ends the turn when Deepgram's endpointing or our finalize says so
+                if not (getattr(transcript_data, 'speech_final', False) or getattr(transcript_data, 'from_finalize', False)):
+                    continue
+            
+            if segments:
+                # Time from the last frame VAD classified as speech to the end of the utterance
+                self.last_eou_delay = max((perf_counter_ns() - self._last_speech_time) / 1e9, 0.0)
+                utterance = " ".join(segments)
+                segments.clear()
+                yield utterance
+    
+    async def warmup(self):
+        """Open the Deepgram connection before the first audio frame arrives"""
+        if not self.is_connected and not self._closed:
+            # Tracked as the in-flight connect so frames arriving meanwhile don't start another one
+            self._reconnect_task = asyncio.create_task(self._connect_live_transcription())
+            await self._reconnect_task
     
     async def _connect_live_transcription(self):
         """Connect to Deepgram live transcription"""
         try:
-            # Configure live transcription options
-            options = LiveOptions(
-                model="nova-2",
-                language="en-US",
-                smart_format=True,
-                interim_results=False,
-                utterance_end_ms="1000",
-                vad_events=True,
-                encoding="linear16",
-                sample_rate=16000,
-                channels=1
-            )
-            
-            # Create live transcription connection
-            self.connection = self.client.listen.websocket.v("1")
-            
-            # Set up event handlers
-            self.connection.on(LiveTranscriptionEvents.Open, self._on_open)
-            self.connection.on(LiveTranscriptionEvents.Transcript, self._on_transcript)
-            self.connection.on(LiveTranscriptionEvents.Error, self._on_error)
-            self.connection.on(LiveTranscriptionEvents.Close, self._on_close)
+            self._loop = asyncio.get_running_loop()
             
-            # Start connection
-            await self.connection.start(options)
+            # Start connection (the websocket client is synchronous, so keep the handshake off the loop)
+            self._pending_start = self._loop.run_in_executor(None, self.connection.start, _LIVE_OPTS)
+            if not await asyncio.shield(self._pending_start):
+                raise ConnectionError("Deepgram websocket failed to start")
+            self._send_buffer.clear()
+            self._vad_buffer.clear()
+            self._pre_roll.clear()
+            self._silent_frames = 0
+            self.speech_active = False
             self.is_connected = True
             
             logger.info("Connected to Deepgram live transcription")
@@ -80,29 +199,74 @@ class STTService:
             logger.error(f"Failed to connect to Deepgram: {e}")
             self.is_connected = False
     
+    def _schedule_reconnect(self):
+        """Start a background reconnect unless one is already running"""
+        if self._closed:
+            return
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+    
     async def _reconnect(self):
-        """Reconnect to Deepgram"""
+        """Reconnect to Deepgram with exponential backoff"""
         logger.info("Reconnecting to Deepgram...")
         self.is_connected = False
-        if self.connection:
-            try:
-                await self.connection.finish()
-            except:
-                pass
-        await self._connect_live_transcription()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.connection.finish)
+        except:
+            pass
+        
+        attempt = 0
+        while not self._closed:
+            await self._connect_live_transcription()
+            if self.is_connected:
+                return
+            
+            delay = min(2 ** attempt, MAX_RECONNECT_DELAY)
+            logger.info(f"Deepgram reconnect failed, retrying in {delay}s")
+            await asyncio.sleep(delay)
+            attempt += 1
     
     def _convert_audio_frame(self, audio_frame):
-        """Convert Livekit audio frame to bytes"""
+        """Convert Livekit audio frame to 16kHz mono linear16 bytes"""
         try:
-            # Convert audio frame to the format expected by Deepgram
-            # This is a simplified conversion - you may need to adjust based on actual frame format
-            if hasattr(audio_frame, 'data'):
-                return audio_frame.data
-            elif hasattr(audio_frame, 'to_bytes'):
-                return audio_frame.to_bytes()
-            else:
-                logger.warning("Unknown audio frame format")
-                return None
+            # Resolve how to read raw bytes from the frame type once, not on every frame
+            if self._read_frame is None:
+                if hasattr(audio_frame, 'data'):
+                    self._read_frame = operator.attrgetter('data')
+                elif hasattr(audio_frame, 'to_bytes'):
+                    self._read_frame = operator.methodcaller('to_bytes')
+                else:
+                    logger.warning("Unknown audio frame format")
+                    return None
+            
+            audio_bytes = self._read_frame(audio_frame)
+            num_channels = getattr(audio_frame, 'num_channels', 1)
+            sample_rate = getattr(audio_frame, 'sample_rate', SAMPLE_RATE)
+            
+            # Frames already in the format expected by Deepgram are passed through untouched
+            if num_channels == 1 and sample_rate == SAMPLE_RATE:
+                return audio_bytes
+            
+            samples = np.frombuffer(audio_bytes, dtype=np.int16)
+            
+            # Downmix interleaved channels to mono
+            if num_channels > 1:
+                samples = samples.reshape(-1, num_channels).mean(axis=1)
+            
+            # Only integer multiples of the Deepgram sample rate can be decimated
+            if sample_rate != SAMPLE_RATE:
+                if sample_rate % SAMPLE_RATE:
+                    if sample_rate not in self._dropped_rates:
+                        self._dropped_rates.add(sample_rate)
+                        logger.warning(f"Dropping audio at unsupported sample rate: {sample_rate}Hz")
+                    return None
+                
+                # Averaging each group of samples low-pass filters them before decimating
+                ratio = sample_rate // SAMPLE_RATE
+                samples = samples[:len(samples) - len(samples) % ratio].reshape(-1, ratio).mean(axis=1)
+            
+            return samples.astype(np.int16).tobytes()
+            
         except Exception as e:
             logger.error(f"Error converting audio frame: {e}")
             return None
@@ -114,8 +278,16 @@ class STTService:
     def _on_transcript(self, *args, **kwargs):
         """Handle transcript result"""
         logger.debug("Received transcript from Deepgram")
-        # Store the latest transcript for retrieval
-        self.latest_transcript = args[0] if args else None
+        # Called on Deepgram's worker thread, so hand the result over to the event loop
+        result = kwargs.get("result")
+        if result is not None and self._loop:
+            self._loop.call_soon_threadsafe(self._transcript_queue.put_nowait, result)
+    
+    def _on_utterance_end(self, *args, **kwargs):
+        """Handle utterance end"""
+        logger.debug("Received utterance end from Deepgram")
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._transcript_queue.put_nowait, _UTTERANCE_END)
     
     def _on_error(self, error, **kwargs):
         """Handle connection error"""
@@ -127,36 +299,28 @@ class STTService:
         logger.debug("Deepgram connection closed")
         self.is_connected = False
     
-    async def _get_transcription_result(self) -> Optional[str]:
-        """Get the latest transcription result"""
-        # Wait for transcript with polling
-        max_wait = 2.0
-        poll_interval = 0.1
-        waited = 0
-        
-        while waited < max_wait:
-            if hasattr(self, 'latest_transcript') and self.latest_transcript:
-                transcript_data = self.latest_transcript
-                self.latest_transcript = None  # Clear for next use
-                
-                # Extract text from Deepgram response
-                if hasattr(transcript_data, 'channel'):
-                    alternatives = transcript_data.channel.alternatives
-                    if alternatives and len(alternatives) > 0:
-                        transcript = alternatives[0].transcript
-                        if transcript and transcript.strip():
-                            return transcript.strip()
-                
-            await asyncio.sleep(poll_interval)
-            waited += poll_interval
-        
+    def _extract_transcript(self, transcript_data) -> Optional[str]:
+        """Extract text from Deepgram response"""
+        if hasattr(transcript_data, 'channel'):
+            alternatives = transcript_data.channel.alternatives
+            if alternatives and len(alternatives) > 0:
+                transcript = alternatives[0].transcript
+                if transcript and transcript.strip():
+                    return transcript.strip()
         return None
     
     async def close(self):
         """Close the STT connection"""
-        if self.connection and self.is_connected:
+        # Stop any pending reconnect and keep push_frame from scheduling a new one
+        self._closed = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        # Let a handshake already in progress complete so finishing doesn't leave its socket behind
+        if self._pending_start is not None and not self._pending_start.done():
+            await asyncio.wait([self._pending_start])
+        if self.connection:
             try:
-                await self.connection.finish()
+                await asyncio.get_running_loop().run_in_executor(None, self.connection.finish)
             except Exception as e:
                 logger.error(f"Error closing Deepgram connection: {e}")
         self.is_connected = False
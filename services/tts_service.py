@@ -1,66 +1,163 @@
 import logging
 import asyncio
-from typing import Optional
+import hashlib
+import json
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
 import io
 import base64
-from elevenlabs.client import ElevenLabs
+import httpx
+import websockets
+from elevenlabs.client import AsyncElevenLabs
 from elevenlabs import Voice, VoiceSettings
 
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Raw 16-bit mono PCM so chunks can be forwarded to the room without decoding
+SAMPLE_RATE = 16000
+OUTPUT_FORMAT = "pcm_16000"
+MODEL_ID = "eleven_turbo_v2"
+
+VOICE_SETTINGS = VoiceSettings(
+    stability=0.75,
+    similarity_boost=0.85,
+    style=0.0,
+    use_speaker_boost=True
+)
+
+# Websocket endpoint that accepts text incrementally and streams audio back as it is generated
+STREAM_INPUT_URL = (
+    "wss://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream-input"
+    "?model_id={model_id}&output_format={output_format}"
+)
+
+# Synthesized audio for short phrases, shared by every session in the worker process
+_audio_cache: "OrderedDict[bytes, bytes]" = OrderedDict()
+
 class TTSService:
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         if Config.TTS_PROVIDER.lower() == "elevenlabs":
-            self.client = ElevenLabs(api_key=Config.ELEVENLABS_API_KEY)
+            self.client = AsyncElevenLabs(api_key=Config.ELEVENLABS_API_KEY, httpx_client=http_client)
             self.provider = "elevenlabs"
         else:
             # Could implement Cartesia here as alternative
             logger.warning("Cartesia TTS not implemented, falling back to ElevenLabs")
-            self.client = ElevenLabs(api_key=Config.ELEVENLABS_API_KEY)
+            self.client = AsyncElevenLabs(api_key=Config.ELEVENLABS_API_KEY, httpx_client=http_client)
             self.provider = "elevenlabs"
     
     async def generate_audio(self, text: str) -> Optional[bytes]:
-        """Generate audio from text using TTS service"""
+        """Generate the complete audio clip for text using TTS service"""
+        chunks = [chunk async for chunk in self.stream_audio(text)]
+        return b"".join(chunks) if chunks else None
+    
+    async def stream_audio(self, text: str) -> AsyncIterator[bytes]:
+        """Stream audio chunks for text as soon as the TTS service produces them"""
+        cacheable = len(text) <= Config.TTS_CACHE_MAX_CHARS
+        if cacheable:
+            key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+            cached = _audio_cache.get(key)
+            if cached is not None:
+                _audio_cache.move_to_end(key)
+                yield cached
+                return
+        
+        chunks = []
         try:
             if self.provider == "elevenlabs":
-                return await self._generate_elevenlabs_audio(text)
+                async for chunk in self._stream_elevenlabs_audio(text):
+                    chunks.append(chunk)
+                    yield chunk
             
         except Exception as e:
             logger.error(f"TTS generation error: {e}")
-            return None
+            return
+        
+        if cacheable and chunks:
+            _audio_cache[key] = b"".join(chunks)
+            if len(_audio_cache) > Config.TTS_CACHE_SIZE:
+                _audio_cache.popitem(last=False)
     
-    async def _generate_elevenlabs_audio(self, text: str) -> Optional[bytes]:
-        """Generate audio using ElevenLabs TTS"""
+    async def warmup(self, *phrases: str):
+        """Open the connection to the TTS service and pre-synthesize fixed phrases into the cache"""
         try:
-            # Use async wrapper for ElevenLabs API call
-            audio_generator = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.client.text_to_speech.convert(
-                    voice_id=Config.VOICE_ID,
-                    text=text,
-                    model_id="eleven_turbo_v2",
-                    voice_settings=VoiceSettings(
-                        stability=0.75,
-                        similarity_boost=0.85,
-                        style=0.0,
-                        use_speaker_boost=True
-                    )
-                )
-            )
-            
-            # Convert generator to bytes
-            audio_bytes = b""
-            for chunk in audio_generator:
-                audio_bytes += chunk
+            if phrases:
+                await asyncio.gather(*(self.generate_audio(phrase) for phrase in phrases))
+            else:
+                await self.client.voices.get(Config.VOICE_ID)
+            logger.info("TTS connection warmed up")
+        except Exception as e:
+            logger.warning(f"TTS warmup failed: {e}")
+    
+    async def stream_text(self, text_chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+        """Stream audio for text that is still being produced, e.g. LLM tokens, over the ElevenLabs websocket"""
+        url = STREAM_INPUT_URL.format(voice_id=Config.VOICE_ID, model_id=MODEL_ID, output_format=OUTPUT_FORMAT)
+        total_bytes = 0
+        try:
+            # The socket is opened as soon as iteration starts, so the handshake overlaps the LLM's first token
+            async with websockets.connect(url, additional_headers={"xi-api-key": Config.ELEVENLABS_API_KEY}) as ws:
+                await ws.send(json.dumps({
+                    "text": " ",
+                    "voice_settings": VOICE_SETTINGS.model_dump(exclude_none=True)
+                }))
+                sender = asyncio.create_task(self._send_text_chunks(ws, text_chunks))
+                try:
+                    async for message in ws:
+                        data = json.loads(message)
+                        if data.get("audio"):
+                            chunk = base64.b64decode(data["audio"])
+                            total_bytes += len(chunk)
+                            yield chunk
+                        if data.get("isFinal"):
+                            break
+                finally:
+                    # Stop feeding text if the listener stopped early, e.g. on interruption
+                    sender.cancel()
+                    try:
+                        await sender
+                    except asyncio.CancelledError:
+                        pass
             
-            logger.info(f"Generated {len(audio_bytes)} bytes of audio")
-            return audio_bytes
+            logger.info("Generated %d bytes of audio", total_bytes)
             
         except Exception as e:
-            logger.error(f"ElevenLabs TTS error: {e}")
-            return None
+            logger.error(f"TTS websocket streaming error: {e}")
+        finally:
+            # Close the text source so the LLM stream behind it releases its connection
+            await text_chunks.aclose()
+    
+    async def _send_text_chunks(self, ws, text_chunks: AsyncIterator[str]):
+        """Forward text to the websocket as it arrives, then ask for the remaining audio"""
+        try:
+            async for text in text_chunks:
+                await ws.send(json.dumps({"text": text, "try_trigger_generation": True}))
+        except Exception as e:
+            logger.error(f"Error forwarding text to TTS: {e}")
+        
+        try:
+            # An empty string flushes the buffered text and ends the stream
+            await ws.send(json.dumps({"text": ""}))
+        except Exception as e:
+            logger.error(f"Error flushing text to TTS: {e}")
+    
+    async def _stream_elevenlabs_audio(self, text: str) -> AsyncIterator[bytes]:
+        """Stream audio using ElevenLabs TTS"""
+        audio_stream = self.client.text_to_speech.stream(
+            voice_id=Config.VOICE_ID,
+            text=text,
+            model_id=MODEL_ID,
+            output_format=OUTPUT_FORMAT,
+            voice_settings=VOICE_SETTINGS
+        )
+        
+        total_bytes = 0
+        async for chunk in audio_stream:
+            if chunk:
+                total_bytes += len(chunk)
+                yield chunk
+        
+        logger.info("Generated %d bytes of audio", total_bytes)
     
     async def _generate_cartesia_audio(self, text: str) -> Optional[bytes]:
         """Generate audio using Cartesia TTS (placeholder for future implementation)"""
@@ -73,5 +170,5 @@ class TTSService:
         return {
             "provider": self.provider,
             "voice_id": Config.VOICE_ID,
-            "model": "eleven_turbo_v2" if self.provider == "elevenlabs" else "unknown"
+            "model": MODEL_ID if self.provider == "elevenlabs" else "unknown"
         }
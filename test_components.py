@@ -12,11 +12,8 @@ from config import Config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def test_components():
-    """Test all agent components"""
-    logger.info("Testing AI Voice Agent Components...")
-    
-    # Test LLM Service
+async def _test_llm():
+    """Test LLM Service"""
     logger.info("Testing LLM Service...")
     llm_service = LLMService()
     try:
@@ -25,8 +22,9 @@ async def test_components():
         logger.info("✓ LLM Service working")
     except Exception as e:
         logger.error(f"✗ LLM Service failed: {e}")
-    
-    # Test TTS Service
+
+async def _test_tts():
+    """Test TTS Service"""
     logger.info("Testing TTS Service...")
     tts_service = TTSService()
     try:
@@ -37,6 +35,13 @@ async def test_components():
             logger.error("✗ TTS Service failed - No audio generated")
     except Exception as e:
         logger.error(f"✗ TTS Service failed: {e}")
+
+async def test_components():
+    """Test all agent components"""
+    logger.info("Testing AI Voice Agent Components...")
+    
+    # LLM and TTS tests are independent network round-trips, so run them concurrently
+    await asyncio.gather(_test_llm(), _test_tts())
     
     # Test Metrics and Excel Export
     logger.info("Testing Metrics and Excel Export...")
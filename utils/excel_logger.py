@@ -1,226 +1,267 @@
-import os
+import asyncio
 import logging
+import numpy as np
 import pandas as pd
+from openpyxl.cell import WriteOnlyCell
 from datetime import datetime
-from typing import Dict, List, Optional
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
 from utils.metrics import SessionMetrics
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Upper edges of the excellent/good/acceptable latency bands; anything above is poor
+LATENCY_BANDS = (1.0, 1.5, 2.0)
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Latencies are written as numbers; these formats give them the same look the old text values had
+SECONDS_FORMAT = '0.000'
+SECONDS_FORMAT_S = '0.000"s"'
+FILENAME_TIME_FORMAT = '%Y%m%d_%H%M%S'
+
+# Prefixes for nested summary keys that don't say what they hold once flattened into a column
+NESTED_KEY_PREFIXES = {'total_measurements': 'count_'}
+
+# Prefer xlsxwriter's streaming writer; openpyxl's write-only mode is the fallback
+try:
+    import xlsxwriter  # noqa: F401
+    EXCEL_ENGINE = 'xlsxwriter'
+except ImportError:
+    EXCEL_ENGINE = 'openpyxl'
+
+# Numba is optional: when installed, large latency breakdowns are a single compiled pass
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Below this many samples the NumPy path is faster than paying Numba's JIT compilation
+NUMBA_MIN_SAMPLES = 10_000
+
+def _classify_latencies_numpy(latencies):
+    """Count latencies in the excellent, good, acceptable and poor bands"""
+    # Bucket each latency by the band edges it does not exceed, keeping the bands closed on the right
+    counts = np.bincount(np.searchsorted(LATENCY_BANDS, latencies, side='left'), minlength=4)
+    return tuple(counts.tolist())
+
+if njit is not None:
+    @njit(cache=True)
+    def _classify_latencies_numba(latencies):
+        """Count latencies in the excellent, good, acceptable and poor bands"""
+        excellent = good = acceptable = poor = 0
+        for latency in latencies:
+            if latency <= LATENCY_BANDS[0]:
+                excellent += 1
+            elif latency <= LATENCY_BANDS[1]:
+                good += 1
+            elif latency <= LATENCY_BANDS[2]:
+                acceptable += 1
+            else:
+                poor += 1
+        return excellent, good, acceptable, poor
+else:
+    _classify_latencies_numba = None
+
+def _classify_latencies(latencies):
+    """Count latencies in the latency bands, compiling only for arrays large enough to benefit"""
+    if _classify_latencies_numba is not None and len(latencies) >= NUMBA_MIN_SAMPLES:
+        return _classify_latencies_numba(latencies)
+    return _classify_latencies_numpy(latencies)
+
+class FormattedNumber(NamedTuple):
+    """A numeric cell that Excel displays with the given number format"""
+    value: float
+    num_format: str
+
 class ExcelLogger:
     def __init__(self):
-        self.output_dir = Config.EXCEL_OUTPUT_DIR
+        # Resolved and created once so exports only join a filename onto it
+        self.output_dir = Path(Config.EXCEL_OUTPUT_DIR)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
         
     async def export_session_metrics(self, session_id: str, session_metrics: SessionMetrics):
         """Export session metrics to Excel file"""
+        # A session that never completed a turn has nothing worth a workbook
+        if not any(len(samples) for samples in (
+            session_metrics.eou_delays,
+            session_metrics.ttft_times,
+            session_metrics.ttfb_times,
+            session_metrics.total_latencies
+        )):
+            logger.info(f"No metrics recorded for session {session_id}, skipping export")
+            return None
+        
         try:
-            # Create filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"call_session_{session_id}_{timestamp}.xlsx"
-            filepath = os.path.join(self.output_dir, filename)
-            
-            # Create Excel writer
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                # Session Summary Sheet
-                await self._write_session_summary(writer, session_metrics)
-                
-                # Detailed Metrics Sheet
-                await self._write_detailed_metrics(writer, session_metrics)
-                
-                # Performance Analysis Sheet
-                await self._write_performance_analysis(writer, session_metrics)
-            
-            logger.info(f"Session metrics exported to: {filepath}")
-            return filepath
+            # Workbook writes are blocking, so keep them off the event loop
+            return await asyncio.to_thread(self._export_session_metrics_sync, session_id, session_metrics)
             
         except Exception as e:
             logger.error(f"Error exporting session metrics: {e}")
             return None
     
-    async def _write_session_summary(self, writer, session_metrics: SessionMetrics):
+    def _export_session_metrics_sync(self, session_id: str, session_metrics: SessionMetrics) -> str:
+        """Write the session workbook"""
+        # Create filename with timestamp
+        timestamp = datetime.now().strftime(FILENAME_TIME_FORMAT)
+        filename = f"call_session_{session_id}_{timestamp}.xlsx"
+        filepath = self.output_dir / filename
+        
+        # Create Excel writer
+        with self._excel_writer(filepath) as writer:
+            # Session Summary Sheet
+            self._write_session_summary(writer, session_metrics)
+            
+            # Detailed Metrics Sheet
+            self._write_detailed_metrics(writer, session_metrics)
+            
+            # Performance Analysis Sheet
+            self._write_performance_analysis(writer, session_metrics)
+        
+        logger.info(f"Session metrics exported to: {filepath}")
+        return str(filepath)
+    
+    def _excel_writer(self, filepath: Path) -> pd.ExcelWriter:
+        """Open a write-optimized Excel writer that streams rows instead of holding every cell"""
+        if EXCEL_ENGINE == 'xlsxwriter':
+            return pd.ExcelWriter(filepath, engine='xlsxwriter', engine_kwargs={'options': {'constant_memory': True}})
+        return pd.ExcelWriter(filepath, engine='openpyxl', engine_kwargs={'write_only': True})
+    
+    def _write_frame(self, writer: pd.ExcelWriter, sheet_name: str, df: pd.DataFrame):
+        """Write a DataFrame to a new sheet"""
+        # Missing values become blank cells, as with DataFrame.to_excel
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        self._write_rows(writer, sheet_name, df.columns.tolist(), rows)
+    
+    def _write_rows(self, writer: pd.ExcelWriter, sheet_name: str, header: List[str], rows: Iterable[Sequence]):
+        """Write a header and rows to a new sheet one row at a time, the order both streaming writers require"""
+        if writer.engine == 'xlsxwriter':
+            worksheet = writer.book.add_worksheet(sheet_name)
+            formats = {}
+            worksheet.write_row(0, 0, header)
+            for row_num, row in enumerate(rows, 1):
+                for col_num, value in enumerate(row):
+                    if isinstance(value, FormattedNumber):
+                        if value.num_format not in formats:
+                            formats[value.num_format] = writer.book.add_format({'num_format': value.num_format})
+                        worksheet.write_number(row_num, col_num, value.value, formats[value.num_format])
+                    else:
+                        worksheet.write(row_num, col_num, self._cell_value(value))
+        else:
+            worksheet = writer.book.create_sheet(sheet_name)
+            worksheet.append(header)
+            for row in rows:
+                worksheet.append([self._openpyxl_cell(worksheet, value) for value in row])
+    
+    def _openpyxl_cell(self, worksheet, value):
+        """Convert a value for a write-only openpyxl sheet, attaching number formats where given"""
+        if isinstance(value, FormattedNumber):
+            cell = WriteOnlyCell(worksheet, value=value.value)
+            cell.number_format = value.num_format
+            return cell
+        return self._cell_value(value)
+    
+    def _cell_value(self, value):
+        """Convert values the writers cannot store natively, e.g. nested dicts, to text"""
+        if value is None or isinstance(value, (str, int, float)):
+            return value
+        return str(value)
+    
+    def _write_session_summary(self, writer, session_metrics: SessionMetrics):
         """Write session summary sheet"""
         duration = (session_metrics.end_time or 0) - session_metrics.start_time
-        averages = session_metrics.get_averages()
-        max_values = session_metrics.get_max_values()
-        min_values = session_metrics.get_min_values()
+        start_str = datetime.fromtimestamp(session_metrics.start_time).strftime(TIME_FORMAT)
+        end_str = datetime.fromtimestamp(session_metrics.end_time).strftime(TIME_FORMAT) if session_metrics.end_time else 'N/A'
+        # One (mean, min, max, violations) tuple per metric instead of three separate reductions
+        stats = session_metrics.summary_stats()
+        eou, ttft, ttfb, total = (stats[name] for name in ('eou_delay', 'ttft', 'ttfb', 'total_latency'))
         
-        summary_data = {
-            'Metric': [
-                'Session ID',
-                'Start Time',
-                'End Time',
-                'Duration (seconds)',
-                'Conversation Turns',
-                'Interruptions',
-                'Total EOU Measurements',
-                'Total TTFT Measurements',
-                'Total TTFB Measurements',
-                'Total Latency Measurements',
-                'Avg EOU Delay (s)',
-                'Avg TTFT (s)',
-                'Avg TTFB (s)',
-                'Avg Total Latency (s)',
-                'Max EOU Delay (s)',
-                'Max TTFT (s)',
-                'Max TTFB (s)',
-                'Max Total Latency (s)',
-                'Min EOU Delay (s)',
-                'Min TTFT (s)',
-                'Min TTFB (s)',
-                'Min Total Latency (s)',
-                'Latency Target Violations (>2s)',
-                'Performance Rating'
-            ],
-            'Value': [
-                session_metrics.session_id,
-                datetime.fromtimestamp(session_metrics.start_time).strftime('%Y-%m-%d %H:%M:%S'),
-                datetime.fromtimestamp(session_metrics.end_time).strftime('%Y-%m-%d %H:%M:%S') if session_metrics.end_time else 'N/A',
-                f"{duration:.2f}",
-                session_metrics.conversation_turns,
-                session_metrics.interruptions,
-                len(session_metrics.eou_delays),
-                len(session_metrics.ttft_times),
-                len(session_metrics.ttfb_times),
-                len(session_metrics.total_latencies),
-                f"{averages['avg_eou_delay']:.3f}",
-                f"{averages['avg_ttft']:.3f}",
-                f"{averages['avg_ttfb']:.3f}",
-                f"{averages['avg_total_latency']:.3f}",
-                f"{max_values['max_eou_delay']:.3f}",
-                f"{max_values['max_ttft']:.3f}",
-                f"{max_values['max_ttfb']:.3f}",
-                f"{max_values['max_total_latency']:.3f}",
-                f"{min_values['min_eou_delay']:.3f}",
-                f"{min_values['min_ttft']:.3f}",
-                f"{min_values['min_ttfb']:.3f}",
-                f"{min_values['min_total_latency']:.3f}",
-                len([l for l in session_metrics.total_latencies if l > Config.TARGET_LATENCY]),
-                self._calculate_performance_rating(averages['avg_total_latency'])
-            ]
-        }
+        rows = [
+            ('Session ID', session_metrics.session_id),
+            ('Start Time', start_str),
+            ('End Time', end_str),
+            ('Duration (seconds)', FormattedNumber(duration, '0.00')),
+            ('Conversation Turns', session_metrics.conversation_turns),
+            ('Interruptions', session_metrics.interruptions),
+            ('Total EOU Measurements', len(session_metrics.eou_delays)),
+            ('Total TTFT Measurements', len(session_metrics.ttft_times)),
+            ('Total TTFB Measurements', len(session_metrics.ttfb_times)),
+            ('Total Latency Measurements', len(session_metrics.total_latencies)),
+            ('Avg EOU Delay (s)', FormattedNumber(eou[0], SECONDS_FORMAT)),
+            ('Avg TTFT (s)', FormattedNumber(ttft[0], SECONDS_FORMAT)),
+            ('Avg TTFB (s)', FormattedNumber(ttfb[0], SECONDS_FORMAT)),
+            ('Avg Total Latency (s)', FormattedNumber(total[0], SECONDS_FORMAT)),
+            ('Max EOU Delay (s)', FormattedNumber(eou[2], SECONDS_FORMAT)),
+            ('Max TTFT (s)', FormattedNumber(ttft[2], SECONDS_FORMAT)),
+            ('Max TTFB (s)', FormattedNumber(ttfb[2], SECONDS_FORMAT)),
+            ('Max Total Latency (s)', FormattedNumber(total[2], SECONDS_FORMAT)),
+            ('Min EOU Delay (s)', FormattedNumber(eou[1], SECONDS_FORMAT)),
+            ('Min TTFT (s)', FormattedNumber(ttft[1], SECONDS_FORMAT)),
+            ('Min TTFB (s)', FormattedNumber(ttfb[1], SECONDS_FORMAT)),
+            ('Min Total Latency (s)', FormattedNumber(total[1], SECONDS_FORMAT)),
+            ('Latency Target Violations (>2s)', total[3]),
+            ('Performance Rating', self._calculate_performance_rating(total[0]))
+        ]
         
-        df_summary = pd.DataFrame(summary_data)
-        df_summary.to_excel(writer, sheet_name='Session Summary', index=False)
+        # The summary is a couple dozen scalars, so it is written directly rather than through a DataFrame
+        self._write_rows(writer, 'Session Summary', ['Metric', 'Value'], rows)
     
-    async def _write_detailed_metrics(self, writer, session_metrics: SessionMetrics):
+    def _write_detailed_metrics(self, writer, session_metrics: SessionMetrics):
         """Write detailed metrics sheet"""
         # Prepare detailed metrics data
-        max_length = max(
-            len(session_metrics.eou_delays),
-            len(session_metrics.ttft_times),
-            len(session_metrics.ttfb_times),
-            len(session_metrics.total_latencies)
+        series = (
+            session_metrics.eou_delays,
+            session_metrics.ttft_times,
+            session_metrics.ttfb_times,
+            session_metrics.total_latencies
         )
+        max_length = max(len(values) for values in series)
         
-        detailed_data = {
-            'Measurement #': list(range(1, max_length + 1)),
-            'EOU Delay (s)': self._pad_list(session_metrics.eou_delays, max_length),
-            'TTFT (s)': self._pad_list(session_metrics.ttft_times, max_length),
-            'TTFB (s)': self._pad_list(session_metrics.ttfb_times, max_length),
-            'Total Latency (s)': self._pad_list(session_metrics.total_latencies, max_length),
-            'Latency Target Met': [
-                'Yes' if lat <= Config.TARGET_LATENCY else 'No' 
-                for lat in self._pad_list(session_metrics.total_latencies, max_length, 0)
-            ]
-        }
+        # Every metric column shares one NaN-padded buffer, filled by slice assignment
+        padded = np.full((max_length, len(series)), np.nan)
+        for column, values in enumerate(series):
+            padded[:len(values), column] = values
+        
+        df_detailed = pd.DataFrame(padded, columns=['EOU Delay (s)', 'TTFT (s)', 'TTFB (s)', 'Total Latency (s)'])
+        df_detailed.insert(0, 'Measurement #', np.arange(1, max_length + 1))
+        # Rows without a latency sample count as meeting the target
+        df_detailed['Latency Target Met'] = np.where(np.nan_to_num(padded[:, 3]) <= Config.TARGET_LATENCY, 'Yes', 'No')
         
-        df_detailed = pd.DataFrame(detailed_data)
-        df_detailed.to_excel(writer, sheet_name='Detailed Metrics', index=False)
+        self._write_frame(writer, 'Detailed Metrics', df_detailed)
     
-    async def _write_performance_analysis(self, writer, session_metrics: SessionMetrics):
+    def _write_performance_analysis(self, writer, session_metrics: SessionMetrics):
         """Write performance analysis sheet"""
         latencies = session_metrics.total_latencies
         
-        if not latencies:
+        if not len(latencies):
             # Empty analysis if no data
-            df_analysis = pd.DataFrame({'Analysis': ['No latency data available']})
-            df_analysis.to_excel(writer, sheet_name='Performance Analysis', index=False)
+            self._write_rows(writer, 'Performance Analysis', ['Analysis'], [['No latency data available']])
             return
         
         # Calculate percentiles
-        latencies_sorted = sorted(latencies)
-        percentiles = {
-            'P50': self._percentile(latencies_sorted, 50),
-            'P75': self._percentile(latencies_sorted, 75),
-            'P90': self._percentile(latencies_sorted, 90),
-            'P95': self._percentile(latencies_sorted, 95),
-            'P99': self._percentile(latencies_sorted, 99)
-        }
+        p50, p75, p90, p95, p99 = np.percentile(latencies, [50, 75, 90, 95, 99])
         
         # Performance breakdown
-        excellent = len([l for l in latencies if l <= 1.0])
-        good = len([l for l in latencies if 1.0 < l <= 1.5])
-        acceptable = len([l for l in latencies if 1.5 < l <= 2.0])
-        poor = len([l for l in latencies if l > 2.0])
-        
-        analysis_data = {
-            'Performance Metric': [
-                'Total Measurements',
-                '50th Percentile (P50)',
-                '75th Percentile (P75)',
-                '90th Percentile (P90)',
-                '95th Percentile (P95)',
-                '99th Percentile (P99)',
-                'Excellent Performance (≤1.0s)',
-                'Good Performance (1.0-1.5s)',
-                'Acceptable Performance (1.5-2.0s)',
-                'Poor Performance (>2.0s)',
-                'Success Rate (≤2.0s)',
-                'Average Latency',
-                'Standard Deviation'
-            ],
-            'Value': [
-                len(latencies),
-                f"{percentiles['P50']:.3f}s",
-                f"{percentiles['P75']:.3f}s",
-                f"{percentiles['P90']:.3f}s",
-                f"{percentiles['P95']:.3f}s",
-                f"{percentiles['P99']:.3f}s",
-                f"{excellent} ({excellent/len(latencies)*100:.1f}%)",
-                f"{good} ({good/len(latencies)*100:.1f}%)",
-                f"{acceptable} ({acceptable/len(latencies)*100:.1f}%)",
-                f"{poor} ({poor/len(latencies)*100:.1f}%)",
-                f"{(len(latencies)-poor)/len(latencies)*100:.1f}%",
-                f"{sum(latencies)/len(latencies):.3f}s",
-                f"{self._std_dev(latencies):.3f}s"
-            ]
-        }
+        excellent, good, acceptable, poor = _classify_latencies(latencies)
+        std_dev = latencies.std(ddof=1) if len(latencies) > 1 else 0.0
         
-        df_analysis = pd.DataFrame(analysis_data)
-        df_analysis.to_excel(writer, sheet_name='Performance Analysis', index=False)
-    
-    def _pad_list(self, lst: List[float], target_length: int, fill_value=None) -> List:
-        """Pad list to target length"""
-        padded = lst.copy()
-        while len(padded) < target_length:
-            padded.append(fill_value)
-        return padded
-    
-    def _percentile(self, sorted_list: List[float], percentile: int) -> float:
-        """Calculate percentile of sorted list"""
-        if not sorted_list:
-            return 0.0
-        
-        index = (percentile / 100) * (len(sorted_list) - 1)
-        lower_index = int(index)
-        upper_index = min(lower_index + 1, len(sorted_list) - 1)
-        
-        if lower_index == upper_index:
-            return sorted_list[lower_index]
-        
-        # Linear interpolation
-        weight = index - lower_index
-        return sorted_list[lower_index] * (1 - weight) + sorted_list[upper_index] * weight
-    
-    def _std_dev(self, values: List[float]) -> float:
-        """Calculate standard deviation"""
-        if len(values) < 2:
-            return 0.0
+        rows = [
+            ('Total Measurements', len(latencies)),
+            ('50th Percentile (P50)', FormattedNumber(p50, SECONDS_FORMAT_S)),
+            ('75th Percentile (P75)', FormattedNumber(p75, SECONDS_FORMAT_S)),
+            ('90th Percentile (P90)', FormattedNumber(p90, SECONDS_FORMAT_S)),
+            ('95th Percentile (P95)', FormattedNumber(p95, SECONDS_FORMAT_S)),
+            ('99th Percentile (P99)', FormattedNumber(p99, SECONDS_FORMAT_S)),
+            ('Excellent Performance (≤1.0s)', f"{excellent} ({excellent/len(latencies)*100:.1f}%)"),
+            ('Good Performance (1.0-1.5s)', f"{good} ({good/len(latencies)*100:.1f}%)"),
+            ('Acceptable Performance (1.5-2.0s)', f"{acceptable} ({acceptable/len(latencies)*100:.1f}%)"),
+            ('Poor Performance (>2.0s)', f"{poor} ({poor/len(latencies)*100:.1f}%)"),
+            ('Success Rate (≤2.0s)', FormattedNumber((len(latencies) - poor) / len(latencies), '0.0%')),
+            ('Average Latency', FormattedNumber(latencies.mean(), SECONDS_FORMAT_S)),
+            ('Standard Deviation', FormattedNumber(std_dev, SECONDS_FORMAT_S))
+        ]
         
-        mean = sum(values) / len(values)
-        variance = sum((x - mean) ** 2 for x in values) / (len(values) - 1)
-        return variance ** 0.5
+        self._write_rows(writer, 'Performance Analysis', ['Performance Metric', 'Value'], rows)
     
     def _calculate_performance_rating(self, avg_latency: float) -> str:
         """Calculate performance rating based on average latency"""
@@ -235,40 +276,62 @@ class ExcelLogger:
     
     async def export_aggregate_report(self, sessions_data: List[Dict]):
         """Export aggregate report for multiple sessions"""
+        if not sessions_data:
+            logger.warning("No session data to export")
+            return None
+        
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"aggregate_report_{timestamp}.xlsx"
-            filepath = os.path.join(self.output_dir, filename)
-            
-            if not sessions_data:
-                logger.warning("No session data to export")
-                return None
-            
-            # Convert sessions data to DataFrame
-            df_sessions = pd.DataFrame(sessions_data)
-            
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df_sessions.to_excel(writer, sheet_name='All Sessions Summary', index=False)
-                
-                # Calculate aggregate statistics
-                if len(sessions_data) > 1:
-                    aggregate_stats = self._calculate_aggregate_stats(sessions_data)
-                    df_aggregate = pd.DataFrame([aggregate_stats])
-                    df_aggregate.to_excel(writer, sheet_name='Aggregate Statistics', index=False)
-            
-            logger.info(f"Aggregate report exported to: {filepath}")
-            return filepath
+            # Workbook writes are blocking, so keep them off the event loop
+            return await asyncio.to_thread(self._export_aggregate_report_sync, sessions_data)
             
         except Exception as e:
             logger.error(f"Error exporting aggregate report: {e}")
             return None
     
+    def _export_aggregate_report_sync(self, sessions_data: List[Dict]) -> str:
+        """Write the aggregate workbook"""
+        timestamp = datetime.now().strftime(FILENAME_TIME_FORMAT)
+        filename = f"aggregate_report_{timestamp}.xlsx"
+        filepath = self.output_dir / filename
+        
+        # Nested summaries (averages, max values, ...) become columns of their own
+        rows = [self._flatten_summary(session) for session in sessions_data]
+        header = list(dict.fromkeys(key for row in rows for key in row))
+        
+        with self._excel_writer(filepath) as writer:
+            self._write_rows(writer, 'All Sessions Summary', header, ([row.get(key) for key in header] for row in rows))
+            
+            # Calculate aggregate statistics
+            if len(sessions_data) > 1:
+                aggregate_stats = self._calculate_aggregate_stats(sessions_data)
+                self._write_rows(writer, 'Aggregate Statistics', list(aggregate_stats), [list(aggregate_stats.values())])
+        
+        logger.info(f"Aggregate report exported to: {filepath}")
+        return str(filepath)
+    
+    def _flatten_summary(self, summary: Dict) -> Dict:
+        """Inline nested dicts of a session summary so each value gets its own column"""
+        flat = {}
+        for key, value in summary.items():
+            if isinstance(value, dict):
+                prefix = NESTED_KEY_PREFIXES.get(key, '')
+                for sub_key, sub_value in value.items():
+                    column = prefix + sub_key
+                    # Qualify with the parent key rather than overwrite a column that already exists
+                    if column in flat:
+                        column = f"{key}.{sub_key}"
+                    flat[column] = sub_value
+            else:
+                flat[key] = value
+        return flat
+    
     def _calculate_aggregate_stats(self, sessions_data: List[Dict]) -> Dict:
         """Calculate aggregate statistics across all sessions"""
         total_duration = sum(session.get('duration', 0) for session in sessions_data)
         total_turns = sum(session.get('conversation_turns', 0) for session in sessions_data)
         total_interruptions = sum(session.get('interruptions', 0) for session in sessions_data)
         
+        target = Config.TARGET_LATENCY
         avg_latencies = [session['averages']['avg_total_latency'] for session in sessions_data if 'averages' in session]
         overall_avg_latency = sum(avg_latencies) / len(avg_latencies) if avg_latencies else 0
         
@@ -278,5 +341,5 @@ class ExcelLogger:
             'total_conversation_turns': total_turns,
             'total_interruptions': total_interruptions,
             'overall_avg_latency': overall_avg_latency,
-            'sessions_meeting_target': len([s for s in sessions_data if s.get('averages', {}).get('avg_total_latency', 999) <= Config.TARGET_LATENCY])
+            'sessions_meeting_target': len([s for s in sessions_data if s.get('averages', {}).get('avg_total_latency', 999) <= target])
         }
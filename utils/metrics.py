@@ -1,139 +1,236 @@
+import math
 import time
 import logging
-from typing import Dict, List, Optional
+import numpy as np
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
-from collections import defaultdict
+
+from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Recorded samples are buffered as (timestamp, kind, value, session index) rows
+RING_SIZE = 65536
+EOU_DELAY, TTFT, TTFB, TOTAL_LATENCY = range(4)
+METRIC_NAMES = ("eou_delay", "ttft", "ttfb", "total_latency")
+MEASUREMENT_NAMES = ("eou_delays", "ttft_times", "ttfb_times", "total_latencies")
+
+# Initial per-metric capacity of a session's sample buffer, doubled whenever it fills up
+SAMPLE_CAPACITY = 256
+
 @dataclass
 class SessionMetrics:
     session_id: str
     start_time: float
     end_time: Optional[float] = None
-    eou_delays: List[float] = field(default_factory=list)
-    ttft_times: List[float] = field(default_factory=list)
-    ttfb_times: List[float] = field(default_factory=list)
-    total_latencies: List[float] = field(default_factory=list)
     conversation_turns: int = 0
     interruptions: int = 0
+    # One float64 row of samples per metric kind, with the number of samples used in each row
+    _samples: np.ndarray = field(default_factory=lambda: np.empty((4, SAMPLE_CAPACITY)), init=False, repr=False, compare=False)
+    _counts: List[int] = field(default_factory=lambda: [0] * 4, init=False, repr=False, compare=False)
+    # Running per-kind reductions, updated as samples arrive so summaries never rescan the buffer
+    _sums: List[float] = field(default_factory=lambda: [0.0] * 4, init=False, repr=False, compare=False)
+    _mins: List[float] = field(default_factory=lambda: [math.inf] * 4, init=False, repr=False, compare=False)
+    _maxes: List[float] = field(default_factory=lambda: [-math.inf] * 4, init=False, repr=False, compare=False)
+    _violations: int = field(default=0, init=False, repr=False, compare=False)
+    
+    @property
+    def eou_delays(self) -> np.ndarray:
+        """End of Utterance delays recorded so far"""
+        return self._samples[EOU_DELAY, :self._counts[EOU_DELAY]]
+    
+    @property
+    def ttft_times(self) -> np.ndarray:
+        """Time to First Token samples recorded so far"""
+        return self._samples[TTFT, :self._counts[TTFT]]
+    
+    @property
+    def ttfb_times(self) -> np.ndarray:
+        """Time to First Byte samples recorded so far"""
+        return self._samples[TTFB, :self._counts[TTFB]]
+    
+    @property
+    def total_latencies(self) -> np.ndarray:
+        """Total pipeline latencies recorded so far"""
+        return self._samples[TOTAL_LATENCY, :self._counts[TOTAL_LATENCY]]
+    
+    def _push(self, kind: int, values: np.ndarray):
+        """Append samples of one metric kind and fold them into its running reductions"""
+        if not len(values):
+            return
+        
+        # Double the buffer when it is full
+        start = self._counts[kind]
+        end = start + len(values)
+        capacity = self._samples.shape[1]
+        if end > capacity:
+            while capacity < end:
+                capacity *= 2
+            grown = np.empty((4, capacity))
+            grown[:, :self._samples.shape[1]] = self._samples
+            self._samples = grown
+        
+        self._samples[kind, start:end] = values
+        self._counts[kind] = end
+        
+        self._sums[kind] += float(values.sum())
+        self._mins[kind] = min(self._mins[kind], float(values.min()))
+        self._maxes[kind] = max(self._maxes[kind], float(values.max()))
+        if kind == TOTAL_LATENCY:
+            self._violations += int((values > Config.TARGET_LATENCY).sum())
+    
+    def summary_stats(self) -> Dict[str, Tuple[float, float, float, int]]:
+        """Get (mean, min, max, target violations) for each metric from the running reductions"""
+        stats = {}
+        for kind, name in enumerate(METRIC_NAMES):
+            count = self._counts[kind]
+            violations = self._violations if kind == TOTAL_LATENCY else 0
+            if count:
+                stats[name] = (self._sums[kind] / count, self._mins[kind], self._maxes[kind], violations)
+            else:
+                stats[name] = (0, 0, 0, violations)
+        return stats
     
     def get_averages(self) -> Dict[str, float]:
         """Calculate average metrics"""
-        return {
-            "avg_eou_delay": sum(self.eou_delays) / len(self.eou_delays) if self.eou_delays else 0,
-            "avg_ttft": sum(self.ttft_times) / len(self.ttft_times) if self.ttft_times else 0,
-            "avg_ttfb": sum(self.ttfb_times) / len(self.ttfb_times) if self.ttfb_times else 0,
-            "avg_total_latency": sum(self.total_latencies) / len(self.total_latencies) if self.total_latencies else 0,
-        }
+        return {f"avg_{name}": stats[0] for name, stats in self.summary_stats().items()}
     
     def get_max_values(self) -> Dict[str, float]:
         """Get maximum values for each metric"""
-        return {
-            "max_eou_delay": max(self.eou_delays) if self.eou_delays else 0,
-            "max_ttft": max(self.ttft_times) if self.ttft_times else 0,
-            "max_ttfb": max(self.ttfb_times) if self.ttfb_times else 0,
-            "max_total_latency": max(self.total_latencies) if self.total_latencies else 0,
-        }
+        return {f"max_{name}": stats[2] for name, stats in self.summary_stats().items()}
     
     def get_min_values(self) -> Dict[str, float]:
         """Get minimum values for each metric"""
-        return {
-            "min_eou_delay": min(self.eou_delays) if self.eou_delays else 0,
-            "min_ttft": min(self.ttft_times) if self.ttft_times else 0,
-            "min_ttfb": min(self.ttfb_times) if self.ttfb_times else 0,
-            "min_total_latency": min(self.total_latencies) if self.total_latencies else 0,
-        }
+        return {f"min_{name}": stats[1] for name, stats in self.summary_stats().items()}
 
 class MetricsCollector:
     def __init__(self):
         self.sessions: Dict[str, SessionMetrics] = {}
         
+        # Hot-path recording only writes a row into this preallocated ring;
+        # rows are folded into the per-session buffers when metrics are read
+        self._ring = np.empty((RING_SIZE, 4), dtype=np.float64)
+        self._ring_idx = 0
+        self._drained_idx = 0
+        self._session_ids: List[str] = []
+        self._session_index: Dict[str, int] = {}
+        
     def start_session(self, session_id: str):
         """Start collecting metrics for a new session"""
         self.sessions[session_id] = SessionMetrics(
             session_id=session_id,
             start_time=time.time()
         )
+        self._session_index[session_id] = len(self._session_ids)
+        self._session_ids.append(session_id)
         logger.info(f"Started metrics collection for session: {session_id}")
     
     def end_session(self, session_id: str) -> Optional[SessionMetrics]:
         """End metrics collection for a session"""
         if session_id in self.sessions:
-            self.sessions[session_id].end_time = time.time()
-            session_duration = self.sessions[session_id].end_time - self.sessions[session_id].start_time
+            self._drain()
+            session = self.sessions[session_id]
+            session.end_time = time.time()
+            session_duration = session.end_time - session.start_time
             
             logger.info(f"Ended metrics collection for session: {session_id} (Duration: {session_duration:.2f}s)")
-            return self.sessions[session_id]
+            
+            latencies = session.total_latencies
+            if len(latencies):
+                p50, p95 = np.percentile(latencies, [50, 95])
+                logger.info(f"Total latency for session {session_id}: mean {latencies.mean():.3f}s, P50 {p50:.3f}s, P95 {p95:.3f}s")
+            return session
         
         logger.warning(f"No session found for ID: {session_id}")
         return None
     
+    def _record(self, session_id: str, kind: int, value: float) -> bool:
+        """Append a sample to the ring buffer"""
+        index = self._session_index.get(session_id)
+        if index is None:
+            return False
+        
+        # Fold pending rows into the sessions before the ring would overwrite them
+        if self._ring_idx - self._drained_idx == RING_SIZE:
+            self._drain()
+        
+        self._ring[self._ring_idx % RING_SIZE] = (time.perf_counter(), kind, value, index)
+        self._ring_idx += 1
+        return True
+    
+    def _drain(self):
+        """Move buffered samples from the ring into their sessions"""
+        pending = self._ring_idx - self._drained_idx
+        if not pending:
+            return
+        
+        start = self._drained_idx % RING_SIZE
+        rows = self._ring.take(range(start, start + pending), axis=0, mode='wrap')
+        self._drained_idx = self._ring_idx
+        
+        for index in np.unique(rows[:, 3]).astype(int):
+            session = self.sessions.get(self._session_ids[index])
+            if session is None:
+                continue
+            
+            session_rows = rows[rows[:, 3] == index]
+            kinds, values = session_rows[:, 1], session_rows[:, 2]
+            for kind in (EOU_DELAY, TTFT, TTFB, TOTAL_LATENCY):
+                session._push(kind, values[kinds == kind])
+            session.conversation_turns += int((kinds == TTFT).sum())
+    
     def record_eou_delay(self, session_id: str, delay: float):
         """Record End of Utterance delay"""
-        if session_id in self.sessions:
-            self.sessions[session_id].eou_delays.append(delay)
-            logger.debug(f"EOU delay recorded: {delay:.3f}s for session {session_id}")
+        if self._record(session_id, EOU_DELAY, delay):
+            logger.debug("EOU delay recorded: %.3fs for session %s", delay, session_id)
     
     def record_ttft(self, session_id: str, ttft: float):
         """Record Time to First Token"""
-        if session_id in self.sessions:
-            self.sessions[session_id].ttft_times.append(ttft)
-            self.sessions[session_id].conversation_turns += 1
-            logger.debug(f"TTFT recorded: {ttft:.3f}s for session {session_id}")
+        if self._record(session_id, TTFT, ttft):
+            logger.debug("TTFT recorded: %.3fs for session %s", ttft, session_id)
     
     def record_ttfb(self, session_id: str, ttfb: float):
         """Record Time to First Byte"""
-        if session_id in self.sessions:
-            self.sessions[session_id].ttfb_times.append(ttfb)
-            logger.debug(f"TTFB recorded: {ttfb:.3f}s for session {session_id}")
+        if self._record(session_id, TTFB, ttfb):
+            logger.debug("TTFB recorded: %.3fs for session %s", ttfb, session_id)
     
     def record_total_latency(self, session_id: str, latency: float):
         """Record total pipeline latency"""
-        if session_id in self.sessions:
-            self.sessions[session_id].total_latencies.append(latency)
-            logger.debug(f"Total latency recorded: {latency:.3f}s for session {session_id}")
+        if self._record(session_id, TOTAL_LATENCY, latency):
+            logger.debug("Total latency recorded: %.3fs for session %s", latency, session_id)
     
     def record_interruption(self, session_id: str):
         """Record conversation interruption"""
         if session_id in self.sessions:
             self.sessions[session_id].interruptions += 1
-            logger.debug(f"Interruption recorded for session {session_id}")
+            logger.debug("Interruption recorded for session %s", session_id)
     
     def get_session_summary(self, session_id: str) -> Optional[Dict]:
         """Get comprehensive session summary"""
-        if session_id not in self.sessions:
+        session = self.sessions.get(session_id)
+        if session is None:
             return None
         
-        session = self.sessions[session_id]
-        averages = session.get_averages()
-        max_values = session.get_max_values()
-        min_values = session.get_min_values()
-        
+        self._drain()
+        return self._session_summary_obj(session)
+    
+    def get_all_sessions_summary(self) -> List[Dict]:
+        """Get summary for all sessions"""
+        self._drain()
+        return [self._session_summary_obj(session) for session in self.sessions.values()]
+    
+    def _session_summary_obj(self, session: SessionMetrics) -> Dict:
+        """Build the summary of an already drained session from its running reductions"""
         duration = (session.end_time or time.time()) - session.start_time
         
         return {
-            "session_id": session_id,
+            "session_id": session.session_id,
             "duration": duration,
             "conversation_turns": session.conversation_turns,
             "interruptions": session.interruptions,
-            "total_measurements": {
-                "eou_delays": len(session.eou_delays),
-                "ttft_times": len(session.ttft_times),
-                "ttfb_times": len(session.ttfb_times),
-                "total_latencies": len(session.total_latencies),
-            },
-            "averages": averages,
-            "max_values": max_values,
-            "min_values": min_values,
-            "latency_target_violations": len([l for l in session.total_latencies if l > 2.0])
+            "total_measurements": dict(zip(MEASUREMENT_NAMES, session._counts)),
+            "averages": session.get_averages(),
+            "max_values": session.get_max_values(),
+            "min_values": session.get_min_values(),
+            "latency_target_violations": session.summary_stats()["total_latency"][3]
         }
-    
-    def get_all_sessions_summary(self) -> List[Dict]:
-        """Get summary for all sessions"""
-        summaries = []
-        for session_id in self.sessions.keys():
-            summary = self.get_session_summary(session_id)
-            if summary:
-                summaries.append(summary)
-        return summaries